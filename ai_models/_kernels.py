@@ -0,0 +1,69 @@
+# OskarTrack AI System – Developed by Mr.OSKAR
+"""
+JIT-compiled micro-kernels for the per-frame hot path
+Falls back to SciPy/pure Python when numba is not installed
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    njit = None
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(cache=True, fastmath=True)
+    def cdist_eu(A, B):
+        """Euclidean distance matrix between (N, 2) and (M, 2) points"""
+        n = A.shape[0]
+        m = B.shape[0]
+        out = np.empty((n, m), dtype=np.float64)
+        for i in range(n):
+            for j in range(m):
+                dx = A[i, 0] - B[j, 0]
+                dy = A[i, 1] - B[j, 1]
+                out[i, j] = np.sqrt(dx * dx + dy * dy)
+        return out
+
+    @njit(cache=True, fastmath=True)
+    def point_in_polygon(px, py, poly_x, poly_y):
+        """Crossing-number test for a single point against one polygon"""
+        inside = False
+        n = poly_x.shape[0]
+        j = n - 1
+        for i in range(n):
+            if (poly_y[i] > py) != (poly_y[j] > py):
+                if px < (poly_x[j] - poly_x[i]) * (py - poly_y[i]) / \
+                        (poly_y[j] - poly_y[i]) + poly_x[i]:
+                    inside = not inside
+            j = i
+        return inside
+
+    # Warm-compile at import so the first real frame doesn't pay the JIT cost
+    cdist_eu(np.zeros((1, 2), dtype=np.int32), np.zeros((1, 2), dtype=np.int32))
+    point_in_polygon(0.0, 0.0, np.zeros(3), np.zeros(3))
+
+else:
+
+    from scipy.spatial import distance as _dist
+
+    def cdist_eu(A, B):
+        """Euclidean distance matrix between (N, 2) and (M, 2) points"""
+        return _dist.cdist(A, B)
+
+    def point_in_polygon(px, py, poly_x, poly_y):
+        """Crossing-number test for a single point against one polygon"""
+        inside = False
+        n = len(poly_x)
+        j = n - 1
+        for i in range(n):
+            if (poly_y[i] > py) != (poly_y[j] > py):
+                if px < (poly_x[j] - poly_x[i]) * (py - poly_y[i]) / \
+                        (poly_y[j] - poly_y[i]) + poly_x[i]:
+                    inside = not inside
+            j = i
+        return inside
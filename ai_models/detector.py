@@ -1,13 +1,160 @@
 # OskarTrack AI System – Developed by Mr.OSKAR
 """
-Person Detection using OpenCV (Simplified for Replit)
-For production: Replace with YOLOv8 or similar
+Person Detection using YOLOv8 (ONNX Runtime) with OpenCV HOG fallback
 """
 
+import os
 import cv2
 import numpy as np
+from scipy.optimize import linear_sum_assignment
 from typing import List, Tuple
 
+from ai_models._kernels import cdist_eu
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+# Path to the exported YOLOv8n ONNX model (person class)
+YOLO_MODEL_PATH = os.getenv("YOLO_MODEL_PATH", "yolov8n.onnx")
+
+
+# Cap per-frame 'Person' labels; text rendering is the expensive part
+MAX_LABELS = 10
+
+
+def draw_detections(image: np.ndarray, detections: List[Tuple],
+                    in_place: bool = False) -> np.ndarray:
+    """Draw bounding boxes on image (copies unless in_place is set)"""
+    output = image if in_place else image.copy()
+    if len(detections) == 0:
+        return output
+
+    # One polylines call for all rectangles instead of 2 C calls per box
+    boxes = np.asarray(detections, dtype=np.int32).reshape(-1, 4)
+    x, y, w, h = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    corners = np.stack((
+        np.stack((x, y), axis=1),
+        np.stack((x + w, y), axis=1),
+        np.stack((x + w, y + h), axis=1),
+        np.stack((x, y + h), axis=1),
+    ), axis=1)  # (N, 4, 2)
+    cv2.polylines(output, corners, True, (0, 255, 0), 2)
+
+    for (bx, by) in zip(x[:MAX_LABELS], y[:MAX_LABELS]):
+        cv2.putText(output, 'Person', (int(bx), int(by) - 10),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    return output
+
+
+class YoloPersonDetector:
+    """YOLOv8 person detector running on ONNX Runtime
+
+    Uses the CUDA execution provider when available, otherwise CPU.
+    Detection runs as a single batched inference call, which is orders of
+    magnitude faster than the HOG sliding-window detector on the same frames.
+    """
+
+    INPUT_SIZE = 640
+    PERSON_CLASS_ID = 0  # COCO class 0 = person
+
+    def __init__(self, model_path: str = YOLO_MODEL_PATH,
+                 confidence: float = 0.5, nms_threshold: float = 0.45):
+        if ort is None:
+            raise RuntimeError("onnxruntime is not installed")
+
+        # Prefer the int8-quantized model when one exists next to the FP32
+        # one: half the weight bytes and VNNI int8 kernels on modern CPUs
+        int8_path = model_path.replace(".onnx", ".int8.onnx")
+        if os.path.exists(int8_path):
+            model_path = int8_path
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"YOLO model not found: {model_path}")
+
+        preferred = ["CUDAExecutionProvider", "CPUExecutionProvider"]
+        available = ort.get_available_providers()
+        providers = [p for p in preferred if p in available]
+
+        # Pin thread counts: one intra-op pool sized to the machine,
+        # no inter-op parallelism, so ORT doesn't oversubscribe cores
+        sess_options = ort.SessionOptions()
+        sess_options.intra_op_num_threads = os.cpu_count() or 1
+        sess_options.inter_op_num_threads = 1
+        sess_options.enable_cpu_mem_arena = True
+
+        self.session = ort.InferenceSession(model_path, sess_options,
+                                            providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+        self.confidence = confidence
+        self.nms_threshold = nms_threshold
+        print(f"✅ YOLO Person Detector initialized ({providers[0]})")
+
+    def detect(self, image: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """
+        Detect persons in image
+        Returns: List of bounding boxes [(x, y, w, h), ...]
+        """
+        return self.detect_batch([image])[0]
+
+    def detect_batch(self, frames: List[np.ndarray]) -> List[List[Tuple[int, int, int, int]]]:
+        """
+        Detect persons in a batch of frames with a single inference call.
+        Stacking N frames into one (N, 3, 640, 640) blob amortizes the
+        session/threadpool overhead across the whole batch.
+        """
+        size = (self.INPUT_SIZE, self.INPUT_SIZE)
+        blob = cv2.dnn.blobFromImages(list(frames), 1 / 255.0, size, swapRB=True)
+        outputs = self.session.run(None, {self.input_name: blob})[0]
+
+        return [self._postprocess(outputs[i], frames[i].shape)
+                for i in range(len(frames))]
+
+    def _postprocess(self, output: np.ndarray, shape: tuple) -> List[Tuple[int, int, int, int]]:
+        """Decode one frame's YOLOv8 output (84, 8400) into person boxes"""
+        preds = output.T  # -> (8400, 84): cx, cy, w, h, 80 class scores
+        scores = preds[:, 4 + self.PERSON_CLASS_ID]
+        keep = scores > self.confidence
+        if not keep.any():
+            return []
+
+        boxes = preds[keep, :4]
+        scores = scores[keep]
+
+        # Center format -> corner format, scaled back to the original frame
+        sx = shape[1] / self.INPUT_SIZE
+        sy = shape[0] / self.INPUT_SIZE
+        xywh = np.empty_like(boxes)
+        xywh[:, 0] = (boxes[:, 0] - boxes[:, 2] / 2) * sx
+        xywh[:, 1] = (boxes[:, 1] - boxes[:, 3] / 2) * sy
+        xywh[:, 2] = boxes[:, 2] * sx
+        xywh[:, 3] = boxes[:, 3] * sy
+
+        indices = cv2.dnn.NMSBoxes(xywh.tolist(), scores.tolist(),
+                                   self.confidence, self.nms_threshold)
+        if len(indices) == 0:
+            return []
+
+        return [tuple(int(v) for v in xywh[i]) for i in np.asarray(indices).flatten()]
+
+    def draw_detections(self, image: np.ndarray, detections: List[Tuple],
+                        in_place: bool = False) -> np.ndarray:
+        """Draw bounding boxes on image"""
+        return draw_detections(image, detections, in_place)
+
+
+def quantize_model(model_path: str = YOLO_MODEL_PATH, output_path: str = None) -> str:
+    """
+    Quantize YOLO weights to int8 (one-time step).
+    The quantized model engages VNNI int8 kernels on modern CPUs.
+    """
+    from onnxruntime.quantization import quantize_dynamic
+    if output_path is None:
+        output_path = model_path.replace(".onnx", ".int8.onnx")
+    quantize_dynamic(model_path, output_path)
+    print(f"✅ Quantized model saved: {output_path}")
+    return output_path
+
 
 class PersonDetector:
     """Simple person detector using OpenCV HOG"""
@@ -16,130 +163,171 @@ class PersonDetector:
         # Initialize HOG descriptor for person detection
         self.hog = cv2.HOGDescriptor()
         self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        # Persistent resize/grayscale buffers, reused across frames to
+        # avoid new allocations per call (allocated on first frame)
+        self._resized = None
+        self._gray = None
         print("✅ Person Detector initialized")
-    
+
     def detect(self, image: np.ndarray) -> List[Tuple[int, int, int, int]]:
         """
         Detect persons in image
         Returns: List of bounding boxes [(x, y, w, h), ...]
         """
-        # Resize for better performance
+        # Resize for better performance, reusing the persistent buffer
         height, width = image.shape[:2]
+        scale = 1.0
         if width > 640:
             scale = 640 / width
-            image = cv2.resize(image, None, fx=scale, fy=scale)
-        
+            new_size = (640, int(height * scale))
+            if self._resized is None or self._resized.shape[:2] != new_size[::-1]:
+                self._resized = np.empty((new_size[1], new_size[0], 3), np.uint8)
+            image = cv2.resize(image, new_size, dst=self._resized)
+
+        # Convert to grayscale once; HOG works on intensity anyway and this
+        # saves the per-scale conversion and 2/3 of the pixel bandwidth
+        if self._gray is None or self._gray.shape != image.shape[:2]:
+            self._gray = np.empty(image.shape[:2], np.uint8)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self._gray)
+
         # Detect people
         boxes, weights = self.hog.detectMultiScale(
-            image,
+            gray,
             winStride=(8, 8),
             padding=(4, 4),
             scale=1.05
         )
         
-        # Filter by confidence
+        # Filter by confidence, mapping boxes back to the input frame's
+        # coordinate space (matching the YOLO detector's contract)
+        inv = 1.0 / scale
         detections = []
         for (x, y, w, h), weight in zip(boxes, weights):
             if weight > 0.5:  # Confidence threshold
-                detections.append((int(x), int(y), int(w), int(h)))
-        
+                detections.append((int(x * inv), int(y * inv),
+                                   int(w * inv), int(h * inv)))
+
         return detections
     
-    def draw_detections(self, image: np.ndarray, detections: List[Tuple]) -> np.ndarray:
+    def draw_detections(self, image: np.ndarray, detections: List[Tuple],
+                        in_place: bool = False) -> np.ndarray:
         """Draw bounding boxes on image"""
-        output = image.copy()
-        for (x, y, w, h) in detections:
-            cv2.rectangle(output, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            cv2.putText(output, 'Person', (x, y - 10),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-        return output
+        return draw_detections(image, detections, in_place)
 
 
 class SimpleTracker:
     """Simple tracking using centroid tracking"""
     
+    INITIAL_CAPACITY = 8
+
     def __init__(self, max_disappeared=30):
         self.next_object_id = 0
-        self.objects = {}  # {object_id: centroid}
-        self.disappeared = {}  # {object_id: frames_disappeared}
         self.max_disappeared = max_disappeared
-    
+        # Struct-of-arrays tracker state: ids, centroids and disappeared
+        # counters live in dense arrays (grown by doubling), so update()
+        # runs on contiguous data with no per-key dict churn
+        self._count = 0
+        self._ids = np.empty(self.INITIAL_CAPACITY, dtype=np.int32)
+        self._cent = np.empty((self.INITIAL_CAPACITY, 2), dtype=np.int32)
+        self._dis = np.empty(self.INITIAL_CAPACITY, dtype=np.int32)
+
+    @property
+    def objects(self):
+        """Public dict view: {object_id: (cx, cy)}"""
+        return {int(self._ids[i]): (int(self._cent[i, 0]), int(self._cent[i, 1]))
+                for i in range(self._count)}
+
+    @property
+    def disappeared(self):
+        """Public dict view: {object_id: frames_disappeared}"""
+        return {int(self._ids[i]): int(self._dis[i]) for i in range(self._count)}
+
     def register(self, centroid):
         """Register new object"""
-        self.objects[self.next_object_id] = centroid
-        self.disappeared[self.next_object_id] = 0
+        if self._count == len(self._ids):
+            # Amortized growth: double the arrays
+            self._ids = np.resize(self._ids, self._count * 2)
+            self._cent = np.resize(self._cent, (self._count * 2, 2))
+            self._dis = np.resize(self._dis, self._count * 2)
+        i = self._count
+        self._ids[i] = self.next_object_id
+        self._cent[i] = centroid
+        self._dis[i] = 0
+        self._count += 1
         self.next_object_id += 1
-    
+
     def deregister(self, object_id):
         """Remove object from tracking"""
-        del self.objects[object_id]
-        del self.disappeared[object_id]
-    
-    def update(self, detections: List[Tuple]) -> dict:
+        index = int(np.flatnonzero(self._ids[:self._count] == object_id)[0])
+        self._remove(index)
+
+    def _remove(self, index):
+        """Swap-with-last removal keeping the arrays dense"""
+        last = self._count - 1
+        if index != last:
+            self._ids[index] = self._ids[last]
+            self._cent[index] = self._cent[last]
+            self._dis[index] = self._dis[last]
+        self._count -= 1
+
+    def _expire(self, indices):
+        """Deregister the given indices (descending order keeps swaps safe)"""
+        for index in np.sort(indices)[::-1]:
+            self._remove(index)
+
+    def update(self, detections) -> dict:
         """
         Update tracked objects with new detections
+        Accepts a list of (x, y, w, h) boxes or an (N, 4) ndarray
         Returns: {object_id: (cx, cy)}
         """
         # If no detections, mark all as disappeared
         if len(detections) == 0:
-            for object_id in list(self.disappeared.keys()):
-                self.disappeared[object_id] += 1
-                if self.disappeared[object_id] > self.max_disappeared:
-                    self.deregister(object_id)
+            self._dis[:self._count] += 1
+            expired = np.flatnonzero(
+                self._dis[:self._count] > self.max_disappeared)
+            self._expire(expired)
             return self.objects
-        
-        # Calculate centroids from detections
-        input_centroids = []
-        for (x, y, w, h) in detections:
-            cx = int(x + w / 2.0)
-            cy = int(y + h / 2.0)
-            input_centroids.append((cx, cy))
-        
+
+        # Calculate centroids from detections (vectorized)
+        boxes = np.asarray(detections, dtype=np.int32).reshape(-1, 4)
+        input_centroids = np.column_stack(
+            (boxes[:, 0] + boxes[:, 2] // 2, boxes[:, 1] + boxes[:, 3] // 2)
+        )
+
         # If no existing objects, register all
-        if len(self.objects) == 0:
+        if self._count == 0:
             for centroid in input_centroids:
                 self.register(centroid)
         else:
             # Match existing objects with new centroids
-            object_ids = list(self.objects.keys())
-            object_centroids = list(self.objects.values())
-            
-            # Calculate distances
-            from scipy.spatial import distance as dist
-            D = dist.cdist(np.array(object_centroids), np.array(input_centroids))
-            
-            # Find minimum distances
-            rows = D.min(axis=1).argsort()
-            cols = D.argmin(axis=1)[rows]
-            
-            used_rows = set()
-            used_cols = set()
-            
-            for (row, col) in zip(rows, cols):
-                if row in used_rows or col in used_cols:
-                    continue
-                
-                if D[row, col] > 50:  # Max distance threshold
-                    continue
-                
-                object_id = object_ids[row]
-                self.objects[object_id] = input_centroids[col]
-                self.disappeared[object_id] = 0
-                
-                used_rows.add(row)
-                used_cols.add(col)
-            
+            D = cdist_eu(self._cent[:self._count], input_centroids)
+            D[D > 50] = 1e9  # Max distance threshold
+            rows, cols = linear_sum_assignment(D)
+
+            # Keep only assignments within the distance threshold
+            valid = D[rows, cols] < 1e9
+            matched_rows = rows[valid]
+            matched_cols = cols[valid]
+
+            self._cent[matched_rows] = input_centroids[matched_cols]
+            self._dis[matched_rows] = 0
+
+            # Flip in-place boolean masks instead of building index sets
+            row_used = np.zeros(D.shape[0], dtype=bool)
+            col_used = np.zeros(D.shape[1], dtype=bool)
+            row_used[matched_rows] = True
+            col_used[matched_cols] = True
+
             # Handle disappeared objects
-            unused_rows = set(range(0, D.shape[0])).difference(used_rows)
-            for row in unused_rows:
-                object_id = object_ids[row]
-                self.disappeared[object_id] += 1
-                if self.disappeared[object_id] > self.max_disappeared:
-                    self.deregister(object_id)
-            
+            unused_rows = np.flatnonzero(~row_used)
+            self._dis[unused_rows] += 1
+            expired = unused_rows[
+                self._dis[unused_rows] > self.max_disappeared]
+            self._expire(expired)
+
             # Register new objects
-            unused_cols = set(range(0, D.shape[1])).difference(used_cols)
-            for col in unused_cols:
+            for col in np.flatnonzero(~col_used):
                 self.register(input_centroids[col])
-        
+
         return self.objects
@@ -5,82 +5,197 @@ Video/Image processing pipeline
 
 import cv2
 import numpy as np
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List
-from ai_models.detector import PersonDetector, SimpleTracker
+from ai_models.detector import PersonDetector, YoloPersonDetector, SimpleTracker
+from ai_models import _kernels
 import json
 
+try:
+    import shapely
+    from shapely import STRtree
+    from shapely.geometry import Polygon
+except ImportError:
+    shapely = None
+
+# Shared pool for zone analysis on crowded frames; the underlying
+# geometry/NumPy calls release the GIL so the workers actually overlap
+_EXECUTOR_WORKERS = os.cpu_count() or 1
+_EXECUTOR = ThreadPoolExecutor(max_workers=_EXECUTOR_WORKERS)
+_PARALLEL_MIN_CENTROIDS = 32  # below this, chunking overhead wins
+
 
 class VideoProcessor:
     """Process video frames for customer tracking"""
     
     def __init__(self):
-        self.detector = PersonDetector()
+        try:
+            self.detector = YoloPersonDetector()
+        except Exception as e:
+            print(f"⚠️  YOLO detector unavailable ({e}), falling back to HOG")
+            self.detector = PersonDetector()
         self.tracker = SimpleTracker(max_disappeared=50)
         self.zones = []  # Will be loaded from database
+        self._zone_polys = []  # Precomputed polygon arrays
+        self._zone_pts = []  # int32 polygon arrays for drawing
+        # Motion gate: skip detection when the scene barely changed
+        self.motion_threshold = 2.0  # Mean absolute difference, 0 disables
+        self._prev_small = None
+        self._cached_result = None
         print("✅ Video Processor initialized")
     
     def load_zones(self, zones: List[Dict]):
-        """Load zone definitions"""
+        """Load zone definitions and precompute polygon arrays"""
         self.zones = zones
+        self._zone_polys = [np.asarray(z['coordinates'], dtype=np.float64)
+                            for z in zones]
+        # int32 copies for cv2 drawing, converted once instead of per frame
+        self._zone_pts = [np.asarray(z['coordinates'], dtype=np.int32)
+                          for z in zones]
+
+        # Spatial index over zone bounding boxes for candidate pruning
+        self._tree = None
+        if shapely is not None and zones:
+            polygons = [Polygon(z['coordinates']) for z in zones]
+            for polygon in polygons:
+                shapely.prepare(polygon)
+            self._tree = STRtree(polygons)
+
         print(f"✅ Loaded {len(zones)} zones")
-    
+
+    @staticmethod
+    def _points_in_polygon(points: np.ndarray, polygon: np.ndarray) -> np.ndarray:
+        """
+        Vectorized ray-cast: test all points against one polygon at once
+        points: (M, 2) array, polygon: (V, 2) array
+        Returns: (M,) boolean array
+        """
+        x = points[:, 0:1]
+        y = points[:, 1:2]
+        p1 = polygon
+        p2 = np.roll(polygon, -1, axis=0)
+        p1x, p1y = p1[:, 0], p1[:, 1]
+        p2x, p2y = p2[:, 0], p2[:, 1]
+
+        # Crossing test for every point against every edge, reduced with xor
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossings = ((p1y > y) != (p2y > y)) & \
+                        (x < (p2x - p1x) * (y - p1y) / (p2y - p1y) + p1x)
+        return np.bitwise_xor.reduce(crossings, axis=1)
+
     def point_in_polygon(self, point: tuple, polygon: List[List]) -> bool:
         """Check if point is inside polygon"""
-        x, y = point
-        n = len(polygon)
-        inside = False
-        
-        p1x, p1y = polygon[0]
-        for i in range(n + 1):
-            p2x, p2y = polygon[i % n]
-            if y > min(p1y, p2y):
-                if y <= max(p1y, p2y):
-                    if x <= max(p1x, p2x):
-                        if p1y != p2y:
-                            xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                        if p1x == p2x or x <= xinters:
-                            inside = not inside
-            p1x, p1y = p2x, p2y
-        
-        return inside
-    
+        poly = np.asarray(polygon, dtype=np.float64)
+        return bool(_kernels.point_in_polygon(
+            float(point[0]), float(point[1]),
+            np.ascontiguousarray(poly[:, 0]), np.ascontiguousarray(poly[:, 1])))
+
+    def detect_zones(self, centroids: List[tuple]) -> List:
+        """Detect zones for all centroids in one vectorized pass per zone"""
+        result = [None] * len(centroids)
+        if not self.zones or not centroids:
+            return result
+
+        points = np.asarray(centroids, dtype=np.float64)
+
+        if self._tree is not None:
+            # R-tree prune: only test polygons whose bbox contains the point
+            pt_idx, zone_idx = self._tree.query(shapely.points(points),
+                                                predicate='intersects')
+            # Earliest zone in declaration order wins, matching the scan order
+            best = np.full(len(centroids), len(self.zones), dtype=np.int64)
+            np.minimum.at(best, pt_idx, zone_idx)
+            for i, j in enumerate(best):
+                if j < len(self.zones):
+                    result[i] = self.zones[j]['id']
+            return result
+
+        unassigned = np.ones(len(centroids), dtype=bool)
+        for zone, poly in zip(self.zones, self._zone_polys):
+            if not unassigned.any():
+                break
+            inside = self._points_in_polygon(points, poly)
+            for i in np.flatnonzero(inside & unassigned):
+                result[i] = zone['id']
+            unassigned &= ~inside
+        return result
+
     def detect_zone(self, centroid: tuple) -> int:
         """Detect which zone a point belongs to"""
-        for zone in self.zones:
-            if self.point_in_polygon(centroid, zone['coordinates']):
-                return zone['id']
-        return None
+        return self.detect_zones([centroid])[0]
     
-    def process_frame(self, frame: np.ndarray) -> Dict:
+    def process_frame(self, frame: np.ndarray, coord_scale: float = 1.0,
+                      use_motion_gate: bool = False) -> Dict:
         """
         Process single frame
+        coord_scale maps frame coordinates back to zone coordinates when the
+        frame was decoded at reduced resolution (e.g. 2.0 for half-size)
+        use_motion_gate enables the skip-on-static-scene shortcut; only the
+        video paths set it, since their frames come from one camera stream —
+        independent uploads must never be served another request's result
         Returns detection results and tracking info
         """
+        # Motion gate: on a near-identical frame, skip the detector and
+        # reuse the last result, only aging the tracker's counters
+        if use_motion_gate and self.motion_threshold:
+            small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (80, 45))
+            if self._prev_small is not None and self._cached_result is not None:
+                diff = cv2.absdiff(small, self._prev_small).mean()
+                if diff < self.motion_threshold:
+                    self._prev_small = small
+                    tracked_objects = self.tracker.update([])
+                    result = dict(self._cached_result)
+                    result['tracked_objects'] = tracked_objects
+                    result['person_count'] = len(tracked_objects)
+                    return result
+            self._prev_small = small
+
         # Detect persons
         detections = self.detector.detect(frame)
-        
+
         # Update tracker
         tracked_objects = self.tracker.update(detections)
         
-        # Analyze zones for each tracked object
-        zone_analysis = {}
-        for object_id, centroid in tracked_objects.items():
-            zone_id = self.detect_zone(centroid)
-            zone_analysis[object_id] = {
-                'position': centroid,
-                'zone_id': zone_id
-            }
+        # Analyze zones for all tracked objects at once
+        object_ids = list(tracked_objects.keys())
+        centroids = list(tracked_objects.values())
+        if coord_scale != 1.0:
+            lookup_points = [(cx * coord_scale, cy * coord_scale)
+                             for cx, cy in centroids]
+        else:
+            lookup_points = centroids
+        if self._tree is None and len(lookup_points) >= _PARALLEL_MIN_CENTROIDS:
+            # Crowded frame without a spatial index: the per-zone Python
+            # loop dominates, so fan it out across the pool. With the
+            # STRtree, one batched vectorized query beats chunked threads.
+            workers = _EXECUTOR_WORKERS
+            chunks = [lookup_points[i::workers] for i in range(workers)]
+            chunk_results = list(_EXECUTOR.map(self.detect_zones, chunks))
+            zone_ids = [None] * len(lookup_points)
+            for offset, chunk_ids in enumerate(chunk_results):
+                zone_ids[offset::workers] = chunk_ids
+        else:
+            zone_ids = self.detect_zones(lookup_points)
+        # Positions are reported in zone (full-resolution) coordinates so
+        # clients can overlay them on the original image
+        zone_analysis = {
+            object_id: {'position': (int(px), int(py)), 'zone_id': zone_id}
+            for object_id, (px, py), zone_id
+            in zip(object_ids, lookup_points, zone_ids)
+        }
         
         # Draw results
         annotated_frame = self.detector.draw_detections(frame, detections)
         
-        # Draw zones
-        for zone in self.zones:
-            coords = np.array(zone['coordinates'], dtype=np.int32)
+        # Draw zones using the precomputed point arrays
+        for zone, coords in zip(self.zones, self._zone_pts):
             cv2.polylines(annotated_frame, [coords], True, (255, 0, 0), 2)
             # Zone label
             if len(coords) > 0:
-                cv2.putText(annotated_frame, zone['name'], 
+                cv2.putText(annotated_frame, zone['name'],
                            tuple(coords[0]), cv2.FONT_HERSHEY_SIMPLEX,
                            0.6, (255, 0, 0), 2)
         
@@ -91,14 +206,23 @@ class VideoProcessor:
                        (centroid[0] - 10, centroid[1] - 10),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
         
-        return {
+        result = {
             'detections': detections,
             'tracked_objects': tracked_objects,
             'zone_analysis': zone_analysis,
             'annotated_frame': annotated_frame,
             'person_count': len(tracked_objects)
         }
+        if use_motion_gate:
+            self._cached_result = result
+        return result
     
+    def _reset_motion_gate(self):
+        """Each video is a fresh stream: never diff its first frames against
+        (or serve cached results from) a previous upload"""
+        self._prev_small = None
+        self._cached_result = None
+
     def process_image(self, image_path: str) -> Dict:
         """Process single image file"""
         frame = cv2.imread(image_path)
@@ -107,13 +231,24 @@ class VideoProcessor:
         
         return self.process_frame(frame)
     
-    def process_video(self, video_path: str, callback=None):
-        """Process video file frame by frame"""
+    def process_video(self, video_path: str, callback=None, decode_backend: str = "cpu"):
+        """Process video file frame by frame
+
+        decode_backend="cuda" decodes on NVDEC via cv2.cudacodec when the
+        OpenCV build supports it, falling back to CPU decode otherwise.
+        """
+        if decode_backend == "cuda":
+            try:
+                return self._process_video_cuda(video_path, callback)
+            except Exception as e:
+                print(f"⚠️  CUDA decode unavailable ({e}), falling back to CPU")
+
         cap = cv2.VideoCapture(video_path)
         
         if not cap.isOpened():
             raise ValueError(f"Could not open video: {video_path}")
         
+        self._reset_motion_gate()
         frame_count = 0
         results = []
         
@@ -124,13 +259,121 @@ class VideoProcessor:
             
             # Process every 5th frame for performance
             if frame_count % 5 == 0:
-                result = self.process_frame(frame)
+                result = self.process_frame(frame, use_motion_gate=True)
                 results.append(result)
                 
                 if callback:
                     callback(result, frame_count)
             
             frame_count += 1
-        
+
+        cap.release()
+        return results
+
+    def _process_video_cuda(self, video_path: str, callback=None):
+        """Decode on NVDEC via cv2.cudacodec and process every 5th frame
+
+        Frames are downloaded to host memory for the current CPU detector;
+        a GPU detector could consume the GpuMat directly and skip the copy.
+        """
+        reader = cv2.cudacodec.createVideoReader(video_path)
+
+        self._reset_motion_gate()
+        frame_count = 0
+        results = []
+
+        while True:
+            ret, gpu_frame = reader.nextFrame()
+            if not ret:
+                break
+
+            # Process every 5th frame for performance
+            if frame_count % 5 == 0:
+                frame = gpu_frame.download()
+                result = self.process_frame(frame, use_motion_gate=True)
+                results.append(result)
+
+                if callback:
+                    callback(result, frame_count)
+
+            frame_count += 1
+
+        return results
+
+    def process_video_threaded(self, video_path: str, callback=None,
+                               output_path: str = None, prefetch: int = 16):
+        """
+        Process video with a 3-stage threaded pipeline:
+        reader thread decodes, main thread detects/tracks, writer thread encodes.
+        Detector/tracker state stays on the main thread so no locks are needed;
+        bounded queues provide back-pressure. Overlapping decode, compute and
+        encode gives a solid throughput win on I/O-bound videos.
+        """
+        cap = cv2.VideoCapture(video_path)
+
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {video_path}")
+
+        self._reset_motion_gate()
+        read_q = queue.Queue(maxsize=prefetch)
+        write_q = queue.Queue(maxsize=prefetch)
+
+        def reader():
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                read_q.put(frame)
+            read_q.put(None)  # Sentinel: end of stream
+
+        def writer():
+            out = None
+            while True:
+                frame = write_q.get()
+                if frame is None:
+                    break
+                if out is None:
+                    height, width = frame.shape[:2]
+                    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+                    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+                    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+                out.write(frame)
+            if out is not None:
+                out.release()
+
+        reader_thread = threading.Thread(target=reader, daemon=True)
+        reader_thread.start()
+
+        writer_thread = None
+        if output_path:
+            writer_thread = threading.Thread(target=writer, daemon=True)
+            writer_thread.start()
+
+        frame_count = 0
+        results = []
+
+        while True:
+            frame = read_q.get()
+            if frame is None:
+                break
+
+            # Process every 5th frame for performance
+            if frame_count % 5 == 0:
+                result = self.process_frame(frame, use_motion_gate=True)
+                results.append(result)
+
+                if writer_thread:
+                    write_q.put(result['annotated_frame'])
+
+                if callback:
+                    callback(result, frame_count)
+
+            frame_count += 1
+
+        reader_thread.join()
+        if writer_thread:
+            write_q.put(None)  # Sentinel: flush and close the writer
+            writer_thread.join()
+
         cap.release()
         return results
@@ -15,11 +15,14 @@ import numpy as np
 import io
 import json
 import os
+import tempfile
 
-from database.engine import init_db, get_db
+import asyncio
+
+from database.engine import init_db, get_db, SessionLocal
 from database import crud, models
 from ai_models.processor import VideoProcessor
-from utils.helpers import generate_customer_id, format_duration, get_date_range
+from utils.helpers import generate_customer_id, format_duration, get_date_range, utcnow, ensure_utc
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -42,6 +45,20 @@ app.mount("/web", StaticFiles(directory="web", html=True), name="web")
 
 # Initialize video processor
 processor = VideoProcessor()
+processor._zones_version = None
+
+
+def sync_processor_zones(db: Session):
+    """Reload zones into the processor only when they changed in the database"""
+    version = crud.get_zones_version(db)
+    if processor._zones_version != version:
+        zones = crud.get_all_zones(db)
+        processor.load_zones([{
+            "id": z.id,
+            "name": z.name,
+            "coordinates": z.coordinates
+        } for z in zones])
+        processor._zones_version = version
 
 # WebSocket connections manager
 class ConnectionManager:
@@ -67,10 +84,28 @@ manager = ConnectionManager()
 
 # ==================== STARTUP ====================
 
+# Cadence for the summary refresh worker (materialized-view emulation)
+SUMMARY_REFRESH_SECONDS = 15 * 60
+
+
+async def summary_refresh_worker():
+    """Periodically refresh the stored daily analytics summary"""
+    while True:
+        db = SessionLocal()
+        try:
+            crud.refresh_daily_summary(db)
+        except Exception as e:
+            print(f"⚠️  Summary refresh failed: {e}")
+        finally:
+            db.close()
+        await asyncio.sleep(SUMMARY_REFRESH_SECONDS)
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
     init_db()
+    asyncio.create_task(summary_refresh_worker())
     print("🚀 OskarTrack System Started")
 
 
@@ -97,7 +132,7 @@ async def health_check():
     """Detailed health check"""
     return {
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": utcnow().isoformat(),
         "database": "connected"
     }
 
@@ -124,7 +159,7 @@ async def get_customers(skip: int = 0, limit: int = 100, db: Session = Depends(g
 @app.get("/api/customers/{customer_id}")
 async def get_customer_details(customer_id: str, db: Session = Depends(get_db)):
     """Get detailed customer information"""
-    customer = crud.get_customer(db, customer_id)
+    customer = crud.get_customer_with_visits(db, customer_id)
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     
@@ -167,7 +202,7 @@ async def get_active_visits(db: Session = Depends(get_db)):
         "id": v.id,
         "customer_id": v.customer.customer_id,
         "entry_time": v.entry_time.isoformat(),
-        "duration": (datetime.utcnow() - v.entry_time).total_seconds()
+        "duration": (utcnow() - ensure_utc(v.entry_time)).total_seconds()
     } for v in visits]
 
 
@@ -220,15 +255,10 @@ async def create_zone(name: str, coordinates: List[List[int]], zone_type: str,
                      description: Optional[str] = None, db: Session = Depends(get_db)):
     """Create new zone"""
     zone = crud.create_zone(db, name, coordinates, zone_type, description)
-    
+
     # Reload zones in processor
-    zones = crud.get_all_zones(db)
-    processor.load_zones([{
-        "id": z.id,
-        "name": z.name,
-        "coordinates": z.coordinates
-    } for z in zones])
-    
+    sync_processor_zones(db)
+
     return {"zone_id": zone.id, "name": zone.name}
 
 
@@ -240,19 +270,41 @@ async def get_daily_analytics(date: Optional[str] = None, db: Session = Depends(
     if date:
         target_date = datetime.fromisoformat(date)
     else:
-        target_date = datetime.utcnow()
+        target_date = utcnow()
     
     stats = crud.get_daily_stats(db, target_date)
     return stats
 
 
+@app.get("/api/analytics/daily/cached")
+async def get_cached_daily_analytics(db: Session = Depends(get_db)):
+    """Daily analytics from the precomputed summary row
+
+    Served from the periodically refreshed AnalyticsSummary instead of
+    re-aggregating visits per request; refreshed_at reports staleness.
+    """
+    row = crud.get_daily_summary(db)
+    if not row:
+        row = crud.refresh_daily_summary(db)
+    return {
+        "date": row.summary_date.strftime("%Y-%m-%d"),
+        "total_visitors": row.total_visitors,
+        "unique_visitors": row.unique_visitors,
+        "returning_visitors": row.returning_visitors,
+        "average_duration": row.average_visit_duration,
+        "peak_hour": row.peak_hour,
+        "peak_visitors_count": row.peak_visitors_count,
+        "refreshed_at": row.created_at.isoformat()
+    }
+
+
 @app.get("/api/analytics/hourly")
 async def get_hourly_analytics(date: Optional[str] = None, db: Session = Depends(get_db)):
     """Get hourly visitor distribution"""
     if date:
         target_date = datetime.fromisoformat(date)
     else:
-        target_date = datetime.utcnow()
+        target_date = utcnow()
     
     distribution = crud.get_hourly_distribution(db, target_date)
     return {
@@ -271,40 +323,46 @@ async def get_zone_analytics(db: Session = Depends(get_db)):
 @app.get("/api/analytics/summary")
 async def get_analytics_summary(days: int = 7, db: Session = Depends(get_db)):
     """Get analytics summary for last N days"""
-    today = datetime.utcnow()
-    stats_list = []
-    
-    for i in range(days):
-        date = today - timedelta(days=i)
-        stats = crud.get_daily_stats(db, date)
-        stats_list.append(stats)
-    
-    return {"summary": stats_list}
+    return {"summary": crud.get_daily_stats_range(db, days)}
 
 
 # ==================== VIDEO/IMAGE PROCESSING ====================
 
+async def save_upload(upload: UploadFile, chunk_size: int = 1 << 20) -> str:
+    """Stream an upload to a temp file in chunks, keeping memory use flat"""
+    suffix = os.path.splitext(upload.filename or "")[1]
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                buffer = await upload.read(chunk_size)
+                if not buffer:
+                    break
+                f.write(buffer)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
 @app.post("/api/process/image")
 async def process_image(file: UploadFile = File(...), db: Session = Depends(get_db)):
     """Process uploaded image for person detection"""
-    # Read image
+    # Read image at half resolution: libjpeg does the downscale during
+    # decode, which is far cheaper than decoding full-size and resizing
     contents = await file.read()
     nparr = np.frombuffer(contents, np.uint8)
-    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    
+    image = cv2.imdecode(nparr, cv2.IMREAD_REDUCED_COLOR_2)
+
     if image is None:
         raise HTTPException(status_code=400, detail="Invalid image file")
-    
-    # Load zones
-    zones = crud.get_all_zones(db)
-    processor.load_zones([{
-        "id": z.id,
-        "name": z.name,
-        "coordinates": z.coordinates
-    } for z in zones])
-    
-    # Process image
-    result = processor.process_frame(image)
+
+    # Load zones (no-op when unchanged)
+    sync_processor_zones(db)
+
+    # Zones are defined in full-resolution coordinates. Both detectors
+    # return boxes in the decoded frame's space, so the only scale factor
+    # is the decode reduction itself (REDUCED_COLOR_2 = exactly 1/2)
+    result = processor.process_frame(image, coord_scale=2.0)
     
     # Encode annotated image
     _, buffer = cv2.imencode('.jpg', result['annotated_frame'])
@@ -321,20 +379,13 @@ async def process_image(file: UploadFile = File(...), db: Session = Depends(get_
 @app.post("/api/process/video")
 async def process_video(file: UploadFile = File(...), db: Session = Depends(get_db)):
     """Process uploaded video"""
-    # Save uploaded video temporarily
-    temp_path = f"/tmp/{file.filename}"
-    with open(temp_path, "wb") as f:
-        f.write(await file.read())
+    # Stream the upload to a temp file without buffering it in memory
+    temp_path = await save_upload(file)
     
     try:
-        # Load zones
-        zones = crud.get_all_zones(db)
-        processor.load_zones([{
-            "id": z.id,
-            "name": z.name,
-            "coordinates": z.coordinates
-        } for z in zones])
-        
+        # Load zones (no-op when unchanged)
+        sync_processor_zones(db)
+
         # Process video
         results = processor.process_video(temp_path)
         
@@ -0,0 +1,32 @@
+# OskarTrack AI System – Developed by Mr.OSKAR
+"""
+Bulk insert helpers for high-volume tables
+"""
+
+from typing import List
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from database.models import TrackingEvent
+
+
+def insert_events(db: Session, rows: List[dict]) -> List[int]:
+    """
+    Insert a batch of tracking events in one round-trip.
+    rows: list of dicts of TrackingEvent column values.
+    Callers should accumulate events and flush every few hundred rows.
+    Returns the new ids on Postgres (RETURNING); other backends return
+    an empty list since their executemany path doesn't report ids.
+    """
+    if not rows:
+        return []
+
+    if db.get_bind().dialect.name == "postgresql":
+        stmt = insert(TrackingEvent).values(rows).returning(TrackingEvent.id)
+        result = db.execute(stmt)
+        db.commit()
+        return [row[0] for row in result]
+
+    # insertmanyvalues/executemany path: one prepared statement, many rows
+    db.execute(insert(TrackingEvent), rows)
+    db.commit()
+    return []
@@ -3,10 +3,14 @@
 CRUD operations for database
 """
 
-from sqlalchemy.orm import Session
-from database.models import Customer, Visit, Zone, TrackingEvent, AnalyticsSummary
+from sqlalchemy import case, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, selectinload
+from database.models import Customer, Visit, VisitZoneDwell, Zone, TrackingEvent, AnalyticsSummary
 from datetime import datetime, timedelta
 from typing import List, Optional
+from utils.helpers import utcnow, ensure_utc
 import json
 
 
@@ -30,16 +34,49 @@ def get_customer(db: Session, customer_id: str):
     return db.query(Customer).filter(Customer.customer_id == customer_id).first()
 
 
+def get_customer_with_visits(db: Session, customer_id: str):
+    """Get customer with visit history eager-loaded (for detail views)"""
+    return db.query(Customer).options(
+        selectinload(Customer.visits)
+    ).filter(Customer.customer_id == customer_id).first()
+
+
 def get_all_customers(db: Session, skip: int = 0, limit: int = 100):
     """Get all customers with pagination"""
     return db.query(Customer).offset(skip).limit(limit).all()
 
 
+def upsert_customer(db: Session, customer_id: str, **fields):
+    """
+    Insert a customer, or bump last_seen/total_visits if it already exists.
+    One INSERT ... ON CONFLICT DO UPDATE statement replaces the racy
+    SELECT-then-INSERT round trip for returning visitors.
+    """
+    dialect = db.get_bind().dialect.name
+    insert_fn = pg_insert if dialect == "postgresql" else sqlite_insert
+    stmt = insert_fn(Customer).values(customer_id=customer_id, **fields)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["customer_id"],
+        set_={
+            "last_seen": func.now(),
+            "total_visits": Customer.total_visits + 1,
+        },
+    )
+    db.execute(stmt)
+    db.commit()
+    # Core inserts bypass the identity map; with expire_on_commit=False a
+    # previously loaded instance would keep its pre-upsert values, so force
+    # a refresh from the row we just wrote
+    return db.query(Customer).filter(
+        Customer.customer_id == customer_id
+    ).populate_existing().first()
+
+
 def update_customer_visit(db: Session, customer_id: str):
     """Update customer's last seen and visit count"""
     customer = get_customer(db, customer_id)
     if customer:
-        customer.last_seen = datetime.utcnow()
+        customer.last_seen = utcnow()
         customer.total_visits += 1
         db.commit()
         db.refresh(customer)
@@ -50,7 +87,14 @@ def update_customer_visit(db: Session, customer_id: str):
 
 def create_visit(db: Session, customer_id: int):
     """Create new visit session"""
-    visit = Visit(customer_id=customer_id)
+    customer = db.query(Customer).filter(Customer.id == customer_id).first()
+    visit = Visit(
+        customer_id=customer_id,
+        # Denormalized copies keep dashboard reads join-free
+        customer_uuid=customer.customer_id if customer else None,
+        customer_age=customer.estimated_age if customer else None,
+        customer_gender=customer.estimated_gender if customer else None,
+    )
     db.add(visit)
     db.commit()
     db.refresh(visit)
@@ -61,13 +105,56 @@ def end_visit(db: Session, visit_id: int):
     """End visit and calculate duration"""
     visit = db.query(Visit).filter(Visit.id == visit_id).first()
     if visit and not visit.exit_time:
-        visit.exit_time = datetime.utcnow()
-        visit.duration = (visit.exit_time - visit.entry_time).total_seconds()
+        visit.exit_time = utcnow()
+        visit.duration = (visit.exit_time - ensure_utc(visit.entry_time)).total_seconds()
         db.commit()
         db.refresh(visit)
     return visit
 
 
+def record_zone_dwell(db: Session, visit_id: int, dwell_map: dict):
+    """
+    Store a visit's per-zone dwell times as normalized rows.
+    Mirrors the Visit.dwell_time_per_zone JSON map so cross-visit
+    aggregations stay in SQL instead of parsing JSON per row.
+    """
+    visit = db.query(Visit).filter(Visit.id == visit_id).first()
+    if not visit:
+        return None
+    visit.dwell_time_per_zone = {str(z): s for z, s in dwell_map.items()}
+    db.query(VisitZoneDwell).filter(
+        VisitZoneDwell.visit_id == visit_id
+    ).delete()
+    for zone_id, seconds in dwell_map.items():
+        db.add(VisitZoneDwell(
+            visit_id=visit_id,
+            zone_id=int(zone_id),
+            seconds=seconds
+        ))
+    db.commit()
+    return visit
+
+
+def get_zone_dwell_totals(db: Session, start: datetime = None, end: datetime = None):
+    """Total dwell seconds per zone, aggregated in SQL (optionally date-bounded)"""
+    query = db.query(
+        VisitZoneDwell.zone_id,
+        func.sum(VisitZoneDwell.seconds),
+        func.count(VisitZoneDwell.visit_id)
+    )
+    if start is not None or end is not None:
+        query = query.join(Visit, Visit.id == VisitZoneDwell.visit_id)
+        if start is not None:
+            query = query.filter(Visit.entry_time >= start)
+        if end is not None:
+            query = query.filter(Visit.entry_time < end)
+    rows = query.group_by(VisitZoneDwell.zone_id).all()
+    return {
+        zone_id: {"total_seconds": round(total or 0, 2), "visits": visits}
+        for zone_id, total, visits in rows
+    }
+
+
 def get_active_visits(db: Session):
     """Get all currently active visits"""
     return db.query(Visit).filter(Visit.exit_time.is_(None)).all()
@@ -104,6 +191,14 @@ def get_all_zones(db: Session):
     return db.query(Zone).filter(Zone.active == True).all()
 
 
+def get_zones_version(db: Session):
+    """Cheap fingerprint of the active zone set, used for cache invalidation"""
+    return db.query(
+        func.count(Zone.id),
+        func.max(Zone.updated_at)
+    ).filter(Zone.active == True).one()
+
+
 def update_zone_stats(db: Session, zone_id: int, visitors: int = None, dwell_time: float = None):
     """Update zone statistics"""
     zone = db.query(Zone).filter(Zone.id == zone_id).first()
@@ -140,55 +235,147 @@ def create_event(db: Session, visit_id: int, event_type: str, position_x: float
 
 # ==================== ANALYTICS OPERATIONS ====================
 
+# AVG over visits that actually have a duration (NULL rows are ignored)
+_duration_avg = func.avg(case((Visit.duration > 0, Visit.duration)))
+
+
 def get_daily_stats(db: Session, date: datetime = None):
-    """Get statistics for a specific day"""
+    """Get statistics for a specific day (aggregated in SQL)"""
     if not date:
-        date = datetime.utcnow()
-    
+        date = utcnow()
+
     start = date.replace(hour=0, minute=0, second=0, microsecond=0)
     end = start + timedelta(days=1)
-    
-    visits = db.query(Visit).filter(
+
+    total_visitors, unique_customers, avg_duration = db.query(
+        func.count(Visit.id),
+        func.count(func.distinct(Visit.customer_id)),
+        _duration_avg
+    ).filter(
         Visit.entry_time >= start,
         Visit.entry_time < end
-    ).all()
-    
-    total_visitors = len(visits)
-    unique_customers = len(set(v.customer_id for v in visits))
-    
-    durations = [v.duration for v in visits if v.duration]
-    avg_duration = sum(durations) / len(durations) if durations else 0
-    
+    ).one()
+
     return {
         "date": date.strftime("%Y-%m-%d"),
         "total_visitors": total_visitors,
         "unique_visitors": unique_customers,
         "returning_visitors": total_visitors - unique_customers,
-        "average_duration": round(avg_duration, 2)
+        "average_duration": round(avg_duration or 0, 2)
     }
 
 
+def get_daily_stats_range(db: Session, days: int = 7):
+    """Get per-day statistics for the last N days in a single query"""
+    today = utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = today - timedelta(days=days - 1)
+
+    date_expr = func.date(Visit.entry_time).label("day")
+    rows = db.query(
+        date_expr,
+        func.count(Visit.id),
+        func.count(func.distinct(Visit.customer_id)),
+        _duration_avg
+    ).filter(
+        Visit.entry_time >= start
+    ).group_by(date_expr).all()
+
+    by_date = {str(row[0]): row for row in rows}
+
+    stats_list = []
+    for i in range(days):
+        date = today - timedelta(days=i)
+        key = date.strftime("%Y-%m-%d")
+        row = by_date.get(key)
+        total = row[1] if row else 0
+        unique = row[2] if row else 0
+        avg_duration = row[3] if row else None
+        stats_list.append({
+            "date": key,
+            "total_visitors": total,
+            "unique_visitors": unique,
+            "returning_visitors": total - unique,
+            "average_duration": round(avg_duration or 0, 2)
+        })
+    return stats_list
+
+
 def get_hourly_distribution(db: Session, date: datetime = None):
-    """Get visitor distribution by hour"""
+    """Get visitor distribution by hour (GROUP BY in SQL)"""
     if not date:
-        date = datetime.utcnow()
-    
+        date = utcnow()
+
     start = date.replace(hour=0, minute=0, second=0, microsecond=0)
     end = start + timedelta(days=1)
-    
-    visits = db.query(Visit).filter(
+
+    if db.get_bind().dialect.name == "sqlite":
+        hour_expr = func.strftime("%H", Visit.entry_time)
+    else:
+        hour_expr = func.extract("hour", Visit.entry_time)
+
+    rows = db.query(
+        hour_expr.label("hour"),
+        func.count(Visit.id)
+    ).filter(
         Visit.entry_time >= start,
         Visit.entry_time < end
-    ).all()
-    
+    ).group_by("hour").all()
+
     hourly_data = {hour: 0 for hour in range(24)}
-    for visit in visits:
-        hour = visit.entry_time.hour
-        hourly_data[hour] += 1
-    
+    for hour, count in rows:
+        hourly_data[int(hour)] = count
+
     return hourly_data
 
 
+def refresh_daily_summary(db: Session, date: datetime = None):
+    """
+    Recompute and upsert the AnalyticsSummary row for a day.
+    Emulates a materialized-view refresh: dashboards read the stored row
+    instead of re-aggregating visits on every request. Works the same on
+    SQLite and Postgres; on Postgres this could become a true
+    REFRESH MATERIALIZED VIEW CONCURRENTLY.
+    """
+    if not date:
+        date = utcnow()
+    start = date.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    stats = get_daily_stats(db, date)
+    hourly = get_hourly_distribution(db, date)
+    peak_hour = max(hourly, key=hourly.get) if any(hourly.values()) else None
+
+    row = db.query(AnalyticsSummary).filter(
+        AnalyticsSummary.summary_type == "daily",
+        AnalyticsSummary.summary_date == start
+    ).first()
+    if row is None:
+        row = AnalyticsSummary(summary_type="daily", summary_date=start)
+        db.add(row)
+
+    row.total_visitors = stats["total_visitors"]
+    row.unique_visitors = stats["unique_visitors"]
+    row.returning_visitors = stats["returning_visitors"]
+    row.average_visit_duration = stats["average_duration"]
+    row.peak_hour = peak_hour
+    row.peak_visitors_count = hourly[peak_hour] if peak_hour is not None else 0
+    row.created_at = utcnow()  # Doubles as the staleness marker
+
+    db.commit()
+    db.refresh(row)
+    return row
+
+
+def get_daily_summary(db: Session, date: datetime = None):
+    """Get the stored daily summary row (None if never refreshed)"""
+    if not date:
+        date = utcnow()
+    start = date.replace(hour=0, minute=0, second=0, microsecond=0)
+    return db.query(AnalyticsSummary).filter(
+        AnalyticsSummary.summary_type == "daily",
+        AnalyticsSummary.summary_date == start
+    ).first()
+
+
 def get_zone_stats(db: Session):
     """Get statistics for all zones"""
     zones = get_all_zones(db)
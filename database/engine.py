@@ -4,28 +4,66 @@ Database engine and session management
 """
 
 import os
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from database.models import Base
 
 # Get database URL from environment, fallback to SQLite
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 if not DATABASE_URL:
-    # Fallback to SQLite for development
+    # Fallback to SQLite for development. Plain (private-cache) connections:
+    # shared-cache mode swaps WAL's reader/writer concurrency for table-level
+    # locks whose SQLITE_LOCKED errors aren't retried by the busy timeout,
+    # which makes concurrent requests fail outright.
     DATABASE_URL = "sqlite:///./oskartrack.db"
     print("⚠️  DATABASE_URL not found, using SQLite fallback: oskartrack.db")
     print("   For production, set DATABASE_URL environment variable")
 
-# Create engine
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# Create engine with a persistent connection pool so connections (and for
+# SQLite, the file handles) are reused instead of reopened per request.
+# For SQLite the pool is small and hard-bounded (no overflow): WAL allows
+# concurrent readers but there is still only one writer, so extra
+# connections would just queue on the write lock.
+# check_same_thread stays off because pooled connections legitimately
+# migrate between FastAPI worker threads; the pool serializes access.
 engine = create_engine(
     DATABASE_URL,
     echo=False,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+    poolclass=QueuePool,
+    pool_size=5 if IS_SQLITE else 10,
+    max_overflow=0 if IS_SQLITE else 20,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+    connect_args={"check_same_thread": False} if IS_SQLITE else {}
 )
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_conn, connection_record):
+        """WAL mode lets readers run concurrently with the single writer"""
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.execute("PRAGMA cache_size=-65536")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+# Create session factory. expire_on_commit=False keeps ORM attributes
+# usable after a mid-request commit instead of re-SELECTing each one on
+# the next access.
+SessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    bind=engine
+)
 
 
 def init_db():
@@ -39,5 +77,55 @@ def get_db():
     db = SessionLocal()
     try:
         yield db
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+@contextmanager
+def count_queries(target=None):
+    """
+    Collect every SQL statement executed inside the block.
+    Debug/test hook for catching N+1 regressions — assert on the length:
+
+        with count_queries() as queries:
+            client.get("/api/customers")
+        assert len(queries) <= 2
+
+    target defaults to the whole engine; pass a Connection to scope the
+    count to just that connection.
+    """
+    if target is None:
+        target = engine
+    queries = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    event.listen(target, "before_cursor_execute", _record)
+    try:
+        yield queries
+    finally:
+        event.remove(target, "before_cursor_execute", _record)
+
+
+@contextmanager
+def session_scope():
+    """
+    Single-transaction session for scripted writes:
+    commits once on success, rolls back on error.
+
+        with session_scope() as db:
+            ...
+    """
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
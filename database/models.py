@@ -3,10 +3,11 @@
 Database Models for OskarTrack Customer Tracking System
 """
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, JSON
+import time
+
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Boolean, ForeignKey, Text, JSON, LargeBinary, Index, func, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
-from datetime import datetime
+from sqlalchemy.orm import relationship, deferred
 
 Base = declarative_base()
 
@@ -17,8 +18,8 @@ class Customer(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(String, unique=True, index=True)  # Unique tracking ID
-    first_seen = Column(DateTime, default=datetime.utcnow)
-    last_seen = Column(DateTime, default=datetime.utcnow)
+    first_seen = Column(DateTime(timezone=True), server_default=func.now())
+    last_seen = Column(DateTime(timezone=True), server_default=func.now())
     total_visits = Column(Integer, default=1)
     total_time_spent = Column(Float, default=0.0)  # in seconds
     
@@ -26,40 +27,81 @@ class Customer(Base):
     estimated_age = Column(Integer, nullable=True)
     estimated_gender = Column(String, nullable=True)
     
-    # Face recognition
-    face_encoding = Column(Text, nullable=True)  # Stored as JSON string
+    # Face recognition: raw float32 embedding bytes (see helpers.decode_face).
+    # Roughly 3x smaller than the old JSON text and no per-float parsing on
+    # read; on Postgres with pgvector this could become a vector() column
+    # with an IVFFlat index for indexed ANN lookups.
+    face_encoding = Column(LargeBinary, nullable=True)
     
-    # Visits relationship
+    # Visits relationship — lazy at the mapper so list reads and the hot
+    # start_visit lookup don't materialize visit histories; the detail
+    # query opts in with selectinload (see crud.get_customer_with_visits)
     visits = relationship("Visit", back_populates="customer")
     
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 
 class Visit(Base):
     """Individual visit session"""
     __tablename__ = "visits"
-    
+    __table_args__ = (
+        # Range scans on entry_time back all the daily/hourly analytics
+        Index("ix_visit_entry_time", "entry_time"),
+        # Partial index covering only open visits (exit_time IS NULL),
+        # which is exactly what get_active_visits filters on
+        Index("ix_visit_exit_null", "exit_time",
+              postgresql_where=text("exit_time IS NULL"),
+              sqlite_where=text("exit_time IS NULL")),
+        # Per-customer visit history scans
+        Index("ix_visits_cust_entry", "customer_id", "entry_time"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(Integer, ForeignKey("customers.id"))
-    
-    entry_time = Column(DateTime, default=datetime.utcnow)
-    exit_time = Column(DateTime, nullable=True)
+
+    # Denormalized customer attributes (filled at creation time) so
+    # visit-range dashboard queries don't need the customers join
+    customer_uuid = Column(String, index=True)
+    customer_age = Column(Integer, nullable=True)
+    customer_gender = Column(String, nullable=True)
+
+    entry_time = Column(DateTime(timezone=True), server_default=func.now())
+    exit_time = Column(DateTime(timezone=True), nullable=True)
     duration = Column(Float, default=0.0)  # in seconds
     
-    # Path tracking
-    path_data = Column(JSON, nullable=True)  # Store movement path
+    # Path tracking: packed float32 (t, x, y) triples (see helpers.pack_path),
+    # deferred so queries that only need duration/zones never load the blob
+    path_data = deferred(Column(LargeBinary, nullable=True))
     zones_visited = Column(JSON, nullable=True)  # List of zone IDs
     
-    # Behavioral metrics
+    # Behavioral metrics. The JSON map is kept for per-visit API reads;
+    # cross-visit rollups use the normalized VisitZoneDwell rows instead
+    # of JSON-parsing every visit in Python.
     dwell_time_per_zone = Column(JSON, nullable=True)  # {zone_id: seconds}
     interactions = Column(Integer, default=0)  # Product interactions count
     
     # Relationship
-    customer = relationship("Customer", back_populates="visits")
+    customer = relationship("Customer", back_populates="visits", lazy="joined")
+    # events stays lazy: no endpoint reads it, and eager-loading here would
+    # cascade through Customer.visits and drag the full event history into
+    # every customer/visit read. Opt in per query with selectinload().
     events = relationship("TrackingEvent", back_populates="visit")
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class VisitZoneDwell(Base):
+    """Per-visit, per-zone dwell seconds, normalized out of Visit.dwell_time_per_zone"""
+    __tablename__ = "visit_zone_dwell"
+    __table_args__ = (
+        # Zone-first ordering serves the SUM ... GROUP BY zone_id rollups
+        Index("ix_vzd_zone_visit", "zone_id", "visit_id"),
+    )
+
+    visit_id = Column(Integer, ForeignKey("visits.id"), primary_key=True)
+    zone_id = Column(Integer, ForeignKey("zones.id"), primary_key=True)
+    seconds = Column(Float, default=0.0)
 
 
 class Zone(Base):
@@ -81,19 +123,29 @@ class Zone(Base):
     average_dwell_time = Column(Float, default=0.0)
     
     active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 
 class TrackingEvent(Base):
     """Real-time tracking events"""
     __tablename__ = "tracking_events"
-    
+    __table_args__ = (
+        # Per-visit event fetches filter by visit and time range
+        Index("ix_events_visit_ts", "visit_id", "timestamp"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     visit_id = Column(Integer, ForeignKey("visits.id"))
     
     event_type = Column(String)  # detection, zone_enter, zone_exit, interaction
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    # Epoch milliseconds: 8 fixed bytes and integer compares on the
+    # highest-volume column, instead of text-encoded datetimes that cost a
+    # parse plus a Python datetime allocation per row. Convert to ISO at
+    # the API boundary when needed. Indexed on its own for pure time-window
+    # scans; the composite (visit_id, timestamp) index can't serve those.
+    timestamp = Column(BigInteger, index=True,
+                       default=lambda: int(time.time() * 1000))
     
     # Location data
     position_x = Column(Float, nullable=True)
@@ -104,16 +156,20 @@ class TrackingEvent(Base):
     extra_data = Column(JSON, nullable=True)
     
     # Relationship
-    visit = relationship("Visit", back_populates="events")
+    visit = relationship("Visit", back_populates="events", lazy="joined")
 
 
 class AnalyticsSummary(Base):
     """Daily/hourly analytics summaries"""
     __tablename__ = "analytics_summary"
-    
+    __table_args__ = (
+        # Summaries are always looked up by type and date together
+        Index("ix_summary_type_date", "summary_type", "summary_date"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
-    
-    summary_date = Column(DateTime, index=True)
+
+    summary_date = Column(DateTime)
     summary_type = Column(String)  # hourly, daily, weekly
     
     # Metrics
@@ -133,4 +189,4 @@ class AnalyticsSummary(Base):
     age_distribution = Column(JSON, nullable=True)
     gender_distribution = Column(JSON, nullable=True)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,85 @@
+# OskarTrack AI System – Developed by Mr.OSKAR
+"""
+Postgres monthly partitioning for the tracking_events table.
+
+tracking_events is append-heavy and always queried by time window, so on
+Postgres we declare it PARTITION BY RANGE (timestamp): the planner prunes
+to one month's partition and the per-partition indexes stay shallow.
+SQLite has no declarative partitioning, so everything here is a no-op
+there and the plain table from models.py is used as-is.
+"""
+
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+# Partitioned parent for fresh Postgres installs. The PK must include the
+# partition key, which is why this diverges from the ORM model's plain
+# integer PK (SQLite needs a single INTEGER PRIMARY KEY for autoincrement).
+# timestamp is epoch milliseconds, matching TrackingEvent.timestamp.
+_PARENT_DDL = """
+CREATE TABLE IF NOT EXISTS tracking_events (
+    id BIGSERIAL NOT NULL,
+    visit_id INTEGER REFERENCES visits (id),
+    event_type VARCHAR,
+    timestamp BIGINT NOT NULL,
+    position_x FLOAT,
+    position_y FLOAT,
+    zone_id INTEGER,
+    extra_data JSON,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp)
+"""
+
+
+def _is_postgres(engine) -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def _month_bounds(date: datetime):
+    start = date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
+
+
+def create_partitioned_events_table(engine):
+    """Create the partitioned tracking_events parent (Postgres only)"""
+    if not _is_postgres(engine):
+        print("⚠️ Partitioning skipped: only supported on PostgreSQL")
+        return False
+    with engine.begin() as conn:
+        conn.execute(text(_PARENT_DDL))
+    print("✅ Partitioned tracking_events table ready")
+    return True
+
+
+def ensure_month_partition(engine, date: datetime = None):
+    """
+    Create the partition covering the given month if it doesn't exist.
+    Call from a daily cron (or pg_partman) so the next month's partition
+    is always in place before rows arrive.
+    """
+    if not _is_postgres(engine):
+        return None
+    if date is None:
+        date = datetime.utcnow()
+    start, end = _month_bounds(date)
+    name = f"tracking_events_{start:%Y%m}"
+    start_ms = int(start.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    end_ms = int(end.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} "
+            f"PARTITION OF tracking_events "
+            f"FOR VALUES FROM ({start_ms}) TO ({end_ms})"
+        ))
+        # Local index per partition keeps per-visit event fetches fast
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{name}_visit_ts "
+            f"ON {name} (visit_id, timestamp)"
+        ))
+    print(f"✅ Partition {name} ready")
+    return name
@@ -3,90 +3,144 @@
 Utility helper functions
 """
 
-import hashlib
+import heapq
+import operator
+import secrets
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List
 import json
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def utcnow() -> datetime:
+    """Timezone-aware UTC now (naive utcnow is deprecated and ambiguous)"""
+    return datetime.now(timezone.utc)
+
+
+def ensure_utc(dt: datetime) -> datetime:
+    """Treat naive datetimes (e.g. SQLite reads) as UTC for safe arithmetic"""
+    if dt is not None and dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
 
 
 def generate_customer_id() -> str:
     """Generate unique customer tracking ID"""
-    return f"CUST_{uuid.uuid4().hex[:12].upper()}"
+    # Hex-encode only the 6 random bytes we keep instead of formatting all
+    # 16 and throwing most of the string away
+    return f"CUST_{uuid.uuid4().bytes[:6].hex().upper()}"
 
 
 def calculate_dwell_time(entry_time: datetime, exit_time: datetime = None) -> float:
     """Calculate time spent in seconds"""
     if exit_time is None:
-        exit_time = datetime.utcnow()
-    return (exit_time - entry_time).total_seconds()
+        exit_time = utcnow()
+    return (ensure_utc(exit_time) - ensure_utc(entry_time)).total_seconds()
 
 
 def format_duration(seconds: float) -> str:
     """Format seconds into human-readable duration"""
-    if seconds < 60:
-        return f"{int(seconds)}s"
-    elif seconds < 3600:
-        minutes = int(seconds / 60)
-        return f"{minutes}m {int(seconds % 60)}s"
-    else:
-        hours = int(seconds / 3600)
-        minutes = int((seconds % 3600) / 60)
-        return f"{hours}h {minutes}m"
+    # Called per row in reports: one int() and two divmods, no float math
+    s = int(seconds)
+    h, rem = divmod(s, 3600)
+    m, s = divmod(rem, 60)
+    if h:
+        return f"{h}h {m}m"
+    if m:
+        return f"{m}m {s}s"
+    return f"{s}s"
+
+
+# Period of day per hour 0-23; one tuple lookup instead of chained comparisons
+_TIME_OF_DAY = (
+    ("night",) * 6 + ("morning",) * 6 + ("afternoon",) * 5
+    + ("evening",) * 4 + ("night",) * 3
+)
 
 
 def get_time_of_day(hour: int) -> str:
     """Get period of day from hour"""
-    if 6 <= hour < 12:
-        return "morning"
-    elif 12 <= hour < 17:
-        return "afternoon"
-    elif 17 <= hour < 21:
-        return "evening"
-    else:
-        return "night"
+    return _TIME_OF_DAY[hour]
 
 
 def calculate_peak_hours(hourly_data: Dict[int, int]) -> List[int]:
     """Find peak hours from hourly distribution"""
-    sorted_hours = sorted(hourly_data.items(), key=lambda x: x[1], reverse=True)
-    return [hour for hour, count in sorted_hours[:3]]
+    # nlargest is O(n log 3) vs a full sort; keep it this way, the function
+    # runs on every dashboard refresh
+    top = heapq.nlargest(3, hourly_data.items(), key=operator.itemgetter(1))
+    return [hour for hour, count in top]
+
+
+def pack_path(points) -> bytes:
+    """Pack a movement path as raw float32 (t, x, y) triples for storage"""
+    return np.asarray(points, dtype=np.float32).tobytes()
+
 
+def unpack_path(data: bytes):
+    """Unpack a stored movement path into an (N, 3) float32 array"""
+    if data is None:
+        return None
+    return np.frombuffer(data, dtype=np.float32).reshape(-1, 3)
 
-def encode_face(face_image) -> str:
+
+def pack_face_encoding(vec) -> bytes:
+    """Pack an embedding vector as raw float32 bytes for storage"""
+    return np.asarray(vec, dtype=np.float32).tobytes()
+
+
+def encode_face(face_image) -> bytes:
     """Encode face for storage (placeholder)"""
-    # In production, use InsightFace or similar
-    return hashlib.md5(str(uuid.uuid4()).encode()).hexdigest()
+    # In production, run InsightFace (or similar) and store the embedding
+    # via pack_face_encoding. The placeholder only needs a random token,
+    # not a hash of a random UUID string.
+    return secrets.token_bytes(16)
 
 
-def decode_face(encoded: str):
-    """Decode stored face encoding (placeholder)"""
-    return None
+def decode_face(encoded: bytes):
+    """Decode stored face encoding into a float32 vector"""
+    if encoded is None:
+        return None
+    return np.frombuffer(encoded, dtype=np.float32)
 
 
 def validate_coordinates(coords: List[List]) -> bool:
     """Validate zone coordinates"""
-    if not coords or len(coords) < 3:
+    # One C-level cast replaces the per-point isinstance checks
+    try:
+        arr = np.asarray(coords, dtype=np.float64)
+    except (TypeError, ValueError):
         return False
-    
-    for point in coords:
-        if not isinstance(point, list) or len(point) != 2:
-            return False
-        if not all(isinstance(x, (int, float)) for x in point):
-            return False
-    
-    return True
+    return arr.ndim == 2 and arr.shape[0] >= 3 and arr.shape[1] == 2 \
+        and bool(np.isfinite(arr).all())
 
 
 def get_date_range(days: int = 7) -> tuple:
     """Get date range for last N days"""
-    end_date = datetime.utcnow()
+    end_date = utcnow()
     start_date = end_date - timedelta(days=days)
     return start_date, end_date
 
 
 def export_to_json(data: any, filename: str):
     """Export data to JSON file"""
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, default=str)
+    if orjson is not None:
+        # C-speed encoder that also handles numpy arrays natively;
+        # binary mode because orjson returns bytes. OPT_NON_STR_KEYS keeps
+        # int-keyed dicts (hourly distributions, dwell-per-zone maps)
+        # working like the stdlib fallback.
+        with open(filename, 'wb') as f:
+            f.write(orjson.dumps(
+                data,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+                | orjson.OPT_NON_STR_KEYS,
+                default=str))
+    else:
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, default=str)
     return filename